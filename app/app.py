@@ -3,25 +3,45 @@ Neighbor Mapper Flask Application
 Web interface for network topology discovery
 """
 
+import atexit
 import logging
-from flask import Flask, render_template, request, jsonify
+import os
+import queue
+import orjson
+from logging.handlers import QueueHandler, QueueListener
+from flask import Flask, render_template, request
+from jinja2 import FileSystemBytecodeCache
 from device_detector import DeviceTypeDetector
 from discovery import TopologyDiscoverer, render_topology_tree, DiscoveryError
 
-# Configure logging
+# Configure logging. Records are handed to a queue and written by a
+# background listener thread, so request threads never block on file I/O.
+LOG_PATH = '/app/logs/app.log'
+log_formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+log_handlers = [logging.FileHandler(LOG_PATH), logging.StreamHandler()]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, *log_handlers)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-    handlers=[
-        logging.FileHandler('/app/logs/app.log'),
-        logging.StreamHandler()
-    ]
+    format='%(message)s',  # Final layout is applied by log_formatter
+    handlers=[QueueHandler(log_queue)]
 )
 
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Persist compiled templates so restarted workers don't re-parse index.html
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', '/tmp/jinja')
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(JINJA_CACHE_DIR)}
+
 # Initialize device type detector
 detector = DeviceTypeDetector()
 
@@ -63,6 +83,7 @@ def discover():
     username = request.form.get('username', '').strip()
     password = request.form.get('password', '')
     max_depth = int(request.form.get('max_depth', 3))
+    refresh = request.form.get('refresh') == 'true'
     
     # Get filter settings
     filters = {
@@ -80,12 +101,12 @@ def discover():
                              device_types=DEVICE_TYPES,
                              error="All fields are required")
     
-    logger.info(f"Discovery request: seed={seed_ip}, type={device_type}, user={username}, depth={max_depth}")
+    logger.info(f"Discovery request: seed={seed_ip}, type={device_type}, user={username}, depth={max_depth}, refresh={refresh}")
     logger.info(f"Filters: {filters}")
     
     try:
         # Create discoverer
-        discoverer = TopologyDiscoverer(detector, max_depth=max_depth, filters=filters)
+        discoverer = TopologyDiscoverer(detector, max_depth=max_depth, filters=filters, refresh=refresh)
         
         # Run discovery
         topology = discoverer.discover(seed_ip, device_type, username, password)
@@ -96,14 +117,8 @@ def discover():
         # Prepare summary
         total_devices = len(topology.devices)
         
-        # Count unique links (each edge only once, not both directions)
-        unique_links = set()
-        for device in topology.devices.values():
-            for link in device.links:
-                # Create a sorted tuple so (A,B) and (B,A) are the same
-                link_pair = tuple(sorted([link.local_device, link.remote_device]))
-                unique_links.add(link_pair)
-        total_links = len(unique_links)
+        # Unique links (A-B and B-A count once) are deduplicated as they're added
+        total_links = len(topology.link_set)
         
         summary = {
             'devices': total_devices,
@@ -134,12 +149,18 @@ def discover():
                              error=f"Unexpected error: {str(e)}")
 
 
+def ojson(data):
+    """Build a JSON response, serialized with orjson"""
+    return app.response_class(orjson.dumps(data), mimetype='application/json')
+
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy'})
+    return ojson({'status': 'healthy'})
 
 
 if __name__ == '__main__':
+    # Development server only; the container runs the app under gunicorn
     logger.info("Starting Neighbor Mapper application")
     app.run(host='0.0.0.0', port=8000, debug=False)
@@ -3,13 +3,33 @@ Device Type Detector
 Uses YAML configuration to map CDP/LLDP platform info to Netmiko device types
 """
 
+import functools
+import re
 import yaml
 import logging
 from pathlib import Path
 from typing import Optional, Dict, List
 
+try:
+    import ahocorasick
+except ImportError:  # Optional: fall back to one regex scan per device type
+    ahocorasick = None
+
 logger = logging.getLogger(__name__)
 
+# Distinct (platform, capabilities, filters) combinations remembered per detector
+DETECT_CACHE_SIZE = 4096
+
+# Capability tokens (uppercase) for each device category, checked in order.
+# Access points come first since Cisco APs also report Trans-Bridge.
+CATEGORY_CAPABILITIES = (
+    ('ap', frozenset({'WLAN', 'W', 'AP', 'TRANS-BRIDGE'})),
+    ('router', frozenset({'ROUTER', 'R'})),
+    ('switch', frozenset({'SWITCH', 'S', 'BRIDGE', 'B'})),
+    ('phone', frozenset({'PHONE', 'P', 'T'})),  # T = telephone
+    ('server', frozenset({'HOST', 'H', 'STATION'})),
+)
+
 
 class DeviceTypeDetector:
     """Detect Netmiko device types from CDP/LLDP platform information"""
@@ -17,9 +37,13 @@ class DeviceTypeDetector:
     def __init__(self, config_path: str = "config/device_type_patterns.yaml"):
         self.config_path = Path(config_path)
         self.patterns = self._load_patterns()
+        self._compiled = self._compile_patterns()
         self.default_type = self.patterns.get('default_device_type', 'cisco_ios')
         # Ensure all capabilities are strings
         self.allowed_capabilities = set(str(c) for c in self.patterns.get('allowed_capabilities', []))
+        self._allowed_upper = frozenset(c.upper() for c in self.allowed_capabilities)
+        # Platform strings repeat across neighbors, so remember each verdict
+        self._detect_cached = functools.lru_cache(maxsize=DETECT_CACHE_SIZE)(self._detect)
         logger.info(f"Device type detector initialized with {len(self.patterns.get('device_types', {}))} device types")
     
     def _load_patterns(self) -> Dict:
@@ -36,6 +60,80 @@ class DeviceTypeDetector:
             logger.error(f"Error loading config: {e}, using defaults")
             return self._get_default_patterns()
     
+    def _compile_patterns(self) -> List[tuple]:
+        """
+        Pre-process device type patterns for matching
+        
+        Each platform/description list is lowercased once and folded into a
+        single regex alternation, so matching a string is one scan per list.
+        
+        Returns:
+            (config order, device_type, compiled entry) tuples sorted by
+            descending priority, ties kept in config order
+        """
+        compiled = []
+        for index, (device_type, config) in enumerate(self.patterns.get('device_types', {}).items()):
+            compiled.append((index, device_type, {
+                'platforms': self._compile_alternation(config.get('platforms', [])),
+                'system_descriptions': self._compile_alternation(config.get('system_descriptions', [])),
+                'priority': config.get('priority', 10),
+            }))
+        compiled.sort(key=lambda item: -item[2]['priority'])
+        
+        # An empty pattern matches even an empty input string; the search
+        # bound in _match_patterns must account for that
+        self._empty_matches = {
+            key: any(entry[key] is not None and entry[key].search('') for _, _, entry in compiled)
+            for key in ('platforms', 'system_descriptions')
+        }
+        
+        if ahocorasick is not None:
+            self._automata = {
+                key: self._build_automaton(key)
+                for key in ('platforms', 'system_descriptions')
+            }
+            self._by_index = {index: (device_type, entry['priority']) for index, device_type, entry in compiled}
+        else:
+            self._automata = None
+        return compiled
+    
+    def _build_automaton(self, key: str) -> tuple:
+        """
+        Build one Aho-Corasick automaton over every device type's patterns
+        
+        Args:
+            key: 'platforms' or 'system_descriptions'
+            
+        Returns:
+            (automaton or None if no patterns, config indices whose pattern
+            list contains an empty string and so matches anything)
+        """
+        owners = {}
+        always = set()
+        for index, config in enumerate(self.patterns.get('device_types', {}).values()):
+            for pattern in config.get(key) or []:
+                pattern = str(pattern).lower()
+                if pattern:
+                    owners.setdefault(pattern, set()).add(index)
+                else:
+                    always.add(index)
+        
+        if not owners:
+            return None, frozenset(always)
+        
+        automaton = ahocorasick.Automaton()
+        for pattern, indices in owners.items():
+            automaton.add_word(pattern, (pattern, frozenset(indices)))
+        automaton.make_automaton()
+        return automaton, frozenset(always)
+    
+    @staticmethod
+    def _compile_alternation(patterns: List) -> Optional[re.Pattern]:
+        """Compile substring patterns into one case-folded regex (None if empty)"""
+        if not patterns:
+            return None
+        return re.compile("|".join(re.escape(str(pattern).lower()) for pattern in patterns))
+    
     def detect_from_cdp(self, platform: str, capabilities: str = "", filters: dict = None) -> Optional[str]:
         """
         Detect device type from CDP platform and capabilities
@@ -48,13 +146,9 @@ class DeviceTypeDetector:
         Returns:
             Netmiko device type string or None if filtered out
         """
-        # Check if this is a device we should crawl based on filters
-        if not self._should_crawl(capabilities, filters):
-            logger.debug(f"Skipping device with capabilities: {capabilities} (filtered out)")
-            return None
-        
-        device_type = self._match_patterns(platform, "")
-        logger.debug(f"CDP platform '{platform}' detected as '{device_type}'")
+        device_type = self._detect_cached(platform, "", capabilities, self._filters_key(filters))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"CDP platform '{platform}' detected as '{device_type}'")
         return device_type
     
     def detect_from_lldp(self, system_desc: str, capabilities: str = "", filters: dict = None) -> Optional[str]:
@@ -69,14 +163,34 @@ class DeviceTypeDetector:
         Returns:
             Netmiko device type string or None if filtered out
         """
+        device_type = self._detect_cached("", system_desc, capabilities, self._filters_key(filters))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"LLDP description detected as '{device_type}'")
+        return device_type
+    
+    @staticmethod
+    def _filters_key(filters: dict = None):
+        """Hashable form of a filters dict for the detection cache"""
+        if filters is None:
+            return None
+        return frozenset(filters.items())
+    
+    def _detect(self, platform: str, system_desc: str, capabilities: str, filters_key) -> Optional[str]:
+        """
+        Uncached detection behind detect_from_cdp/detect_from_lldp
+        
+        Returns:
+            Netmiko device type string or None if filtered out
+        """
+        filters = dict(filters_key) if filters_key is not None else None
+        
         # Check if this is a device we should crawl based on filters
         if not self._should_crawl(capabilities, filters):
-            logger.debug(f"Skipping device with capabilities: {capabilities} (filtered out)")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Skipping device with capabilities: {capabilities} (filtered out)")
             return None
         
-        device_type = self._match_patterns("", system_desc)
-        logger.debug(f"LLDP description detected as '{device_type}'")
-        return device_type
+        return self._match_patterns(platform, system_desc)
     
     def _should_crawl(self, capabilities: str, filters: dict = None) -> bool:
         """
@@ -100,7 +214,7 @@ class DeviceTypeDetector:
         
         # If no filters provided, use old behavior (routers and switches only)
         if filters is None:
-            return bool(caps & {str(c).upper() for c in self.allowed_capabilities})
+            return bool(caps & self._allowed_upper)
         
         # Check each device type based on capabilities
         device_category = self._categorize_device(caps)
@@ -129,29 +243,9 @@ class DeviceTypeDetector:
         Returns:
             Device category: 'router', 'switch', 'phone', 'server', 'ap', or 'other'
         """
-        # Access Point detection (check BEFORE bridge, since Trans-Bridge = AP)
-        if any(c in caps for c in ['WLAN', 'W', 'AP']):
-            return 'ap'
-        
-        # Check for Trans-Bridge (Cisco APs report as this)
-        if 'TRANS-BRIDGE' in caps:
-            return 'ap'
-        
-        # Router detection
-        if any(c in caps for c in ['ROUTER', 'R']):
-            return 'router'
-        
-        # Switch/Bridge detection
-        if any(c in caps for c in ['SWITCH', 'S', 'BRIDGE', 'B']):
-            return 'switch'
-        
-        # Phone detection
-        if any(c in caps for c in ['PHONE', 'P', 'T']):  # T = telephone
-            return 'phone'
-        
-        # Server/Host detection
-        if any(c in caps for c in ['HOST', 'H', 'STATION']):
-            return 'server'
+        for category, tokens in CATEGORY_CAPABILITIES:
+            if not tokens.isdisjoint(caps):
+                return category
         
         # Default to other
         return 'other'
@@ -169,41 +263,105 @@ class DeviceTypeDetector:
         """
         platform_lower = str(platform).lower()
         desc_lower = str(system_desc).lower()
+        debug = logger.isEnabledFor(logging.DEBUG)
+        
+        if self._automata is not None:
+            return self._match_automata(platform_lower, desc_lower, debug)
         
-        matches = []
+        # Best score a device type of priority p can still reach is p * weight
+        weight = 0
+        if platform_lower or self._empty_matches['platforms']:
+            weight += 1
+        if desc_lower or self._empty_matches['system_descriptions']:
+            weight += 0.5
         
-        for device_type, config in self.patterns.get('device_types', {}).items():
+        best_type = None
+        best_score = 0
+        best_index = 0
+        
+        # Entries are sorted by priority, so stop once nothing left can win
+        for index, device_type, compiled in self._compiled:
+            if best_type is not None and best_score > compiled['priority'] * weight:
+                break
+            
             score = 0
             
             # Check platform patterns
-            for pattern in config.get('platforms', []):
-                if str(pattern).lower() in platform_lower:
-                    score += config.get('priority', 10)
-                    logger.debug(f"Platform pattern '{pattern}' matched for {device_type}")
-                    break
+            if compiled['platforms'] is not None:
+                match = compiled['platforms'].search(platform_lower)
+                if match:
+                    score += compiled['priority']
+                    if debug:
+                        logger.debug(f"Platform pattern '{match.group(0)}' matched for {device_type}")
             
             # Check system description patterns
-            for pattern in config.get('system_descriptions', []):
-                if str(pattern).lower() in desc_lower:
-                    score += config.get('priority', 10) * 0.5
-                    logger.debug(f"Description pattern '{pattern}' matched for {device_type}")
-                    break
+            if compiled['system_descriptions'] is not None:
+                match = compiled['system_descriptions'].search(desc_lower)
+                if match:
+                    score += compiled['priority'] * 0.5
+                    if debug:
+                        logger.debug(f"Description pattern '{match.group(0)}' matched for {device_type}")
+            
+            # Highest score wins; ties go to the device type listed first
+            if score > best_score or (best_type is not None and score == best_score and index < best_index):
+                best_type, best_score, best_index = device_type, score, index
+        
+        if best_type is not None:
+            return best_type
+        
+        if debug:
+            logger.debug(f"No pattern matched, using default: {self.default_type}")
+        return self.default_type
+    
+    def _scan(self, key: str, text: str, debug: bool) -> set:
+        """Config indices of every device type with a `key` pattern in text"""
+        automaton, matched = self._automata[key]
+        matched = set(matched)
+        if automaton is not None:
+            for _, (pattern, indices) in automaton.iter(text):
+                if debug:
+                    logger.debug(f"Pattern '{pattern}' matched in {key}")
+                matched |= indices
+        return matched
+    
+    def _match_automata(self, platform_lower: str, desc_lower: str, debug: bool) -> str:
+        """
+        Same scoring as _match_patterns, with each string scanned only once
+        
+        Returns:
+            Best matching device type
+        """
+        platform_hits = self._scan('platforms', platform_lower, debug)
+        desc_hits = self._scan('system_descriptions', desc_lower, debug)
+        
+        best_type = None
+        best_score = 0
+        best_index = 0
+        for index in platform_hits | desc_hits:
+            device_type, priority = self._by_index[index]
+            score = 0
+            if index in platform_hits:
+                score += priority
+            if index in desc_hits:
+                score += priority * 0.5
             
-            if score > 0:
-                matches.append((device_type, score))
+            # Highest score wins; ties go to the device type listed first
+            if score > best_score or (best_type is not None and score == best_score and index < best_index):
+                best_type, best_score, best_index = device_type, score, index
         
-        if matches:
-            # Return highest scoring match
-            matches.sort(key=lambda x: x[1], reverse=True)
-            return matches[0][0]
+        if best_type is not None:
+            return best_type
         
-        logger.debug(f"No pattern matched, using default: {self.default_type}")
+        if debug:
+            logger.debug(f"No pattern matched, using default: {self.default_type}")
         return self.default_type
     
     def reload_config(self):
         """Reload patterns from configuration file"""
         self.patterns = self._load_patterns()
+        self._compiled = self._compile_patterns()
         self.default_type = self.patterns.get('default_device_type', 'cisco_ios')
+        self._detect_cached.cache_clear()
         logger.info("Configuration reloaded")
     
     def _get_default_patterns(self) -> Dict:
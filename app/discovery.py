@@ -3,20 +3,111 @@ Network Topology Discovery Engine
 Recursively discovers network topology using CDP/LLDP
 """
 
+import hashlib
+import ipaddress
 import logging
-from collections import deque
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
 from netmiko import ConnectHandler, NetmikoTimeoutException, NetmikoAuthenticationException
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
 from device_detector import DeviceTypeDetector
-from parsers import parse_cdp_neighbors_detail, parse_lldp_neighbors_detail, merge_neighbor_info
-from mock_devices import is_mock_mode, get_mock_connection
+from parsers import Neighbor, parse_cdp_neighbors_detail, parse_lldp_neighbors_detail, merge_neighbor_info, protocols_of
+from mock_devices import MockNetworkDevice, is_mock_mode, get_mock_connection
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on SSH handshakes in flight at once. sshd's default
+# MaxStartups (10) drops unauthenticated connections beyond that.
+MAX_CONCURRENT_HANDSHAKES = 8
+
+
+def _default_max_workers() -> int:
+    """
+    Devices probed concurrently per BFS level
+    
+    Probes are I/O bound, so scale with CPUs from a floor of 32, but leave
+    file descriptors to spare since every probe holds an SSH socket.
+    """
+    workers = max(32, (os.cpu_count() or 1) * 8)
+    if resource is not None:
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft_limit != resource.RLIM_INFINITY:
+            workers = min(workers, max(1, soft_limit // 4))
+    return workers
+
+
+DEFAULT_MAX_WORKERS = _default_max_workers()
+
+# Show commands used to collect neighbors, sent to the device in one write
+NEIGHBOR_COMMANDS = ["show cdp neighbors detail", "show lldp neighbors detail"]
+
+# Device types whose prompt is always Netmiko's base_prompt plus > or #, which
+# _send_batched relies on to split the output. Others (Comware's <HPE>,
+# EXOS's "host.3 #", EdgeOS's $) get one send_command per show command.
+BATCHED_DEVICE_TYPES = frozenset({'cisco_ios', 'cisco_xe', 'cisco_nxos', 'cisco_xr', 'arista_eos'})
+
+# Idle SSH sessions kept open between discoveries. Only used when a session
+# can outlive the NeighborCache entry that answers for its device in the
+# meantime, i.e. idle timeout above NEIGHBOR_CACHE_TTL or the cache disabled
+CONNECTION_POOL_MAX_SIZE = int(os.environ.get('CONNECTION_POOL_MAX_SIZE', 64))
+CONNECTION_POOL_IDLE_TIMEOUT = float(os.environ.get('CONNECTION_POOL_IDLE_TIMEOUT', 120))
+CONNECTION_POOL_MAX_AGE = float(os.environ.get('CONNECTION_POOL_MAX_AGE', 900))
+
+# Seconds a device's probe result is reused by later discoveries, and the
+# most results kept at once
+NEIGHBOR_CACHE_TTL = int(os.environ.get('NEIGHBOR_CACHE_TTL', 300))
+NEIGHBOR_CACHE_MAX_SIZE = int(os.environ.get('NEIGHBOR_CACHE_MAX_SIZE', 4096))
+
+# Dotted quad with leading zeros in its octets; the groups drop the padding
+_ZERO_PADDED_IPV4_RE = re.compile(r"0*(\d{1,3})\.0*(\d{1,3})\.0*(\d{1,3})\.0*(\d{1,3})")
+
+# Tree drawing pieces, indexed by "is last child" (False -> 0, True -> 1)
+_INDENT = ("│  ", "   ")
+_CONN = ("├─", "└─")
+
+
+def _outcome(future):
+    """Result of a finished future, or the exception it raised"""
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+
+def _canon(host: str) -> Union[int, bytes, str]:
+    """
+    Canonical dedupe key for a device address
+    
+    IPv4 addresses map to their 32-bit integer value, which hashes far more
+    cheaply than the dotted string; zero-padded octets ("10.000.000.001"),
+    which ipaddress rejects, are read as decimal first. IPv6 addresses map
+    to their packed form so different spellings (zero compression, case)
+    collide without clashing with the IPv4 integer space. Anything else is
+    treated as a case-insensitive hostname.
+    """
+    host = host.strip()
+    padded = _ZERO_PADDED_IPV4_RE.fullmatch(host)
+    try:
+        address = ipaddress.ip_address(".".join(padded.groups()) if padded else host)
+    except ValueError:
+        return host.lower()
+    return int(address) if address.version == 4 else address.packed
+
 
-@dataclass
+@dataclass(slots=True)
 class Device:
     """Represents a discovered network device"""
     hostname: str
@@ -26,7 +117,7 @@ class Device:
     links: List['Link'] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class Link:
     """Represents a connection between two devices"""
     local_device: str
@@ -37,14 +128,24 @@ class Link:
     protocols: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class Topology:
     """Network topology graph"""
     devices: Dict[str, Device] = field(default_factory=dict)
+    name2id: Dict[str, int] = field(default_factory=dict)  # hostname -> contiguous int id
+    link_set: Set[Tuple[int, int]] = field(default_factory=set)  # Unique (low id, high id) links
+    
+    def intern(self, hostname: str) -> int:
+        """Return the integer id for a hostname, assigning the next one if new"""
+        node_id = self.name2id.get(hostname)
+        if node_id is None:
+            node_id = self.name2id[hostname] = len(self.name2id)
+        return node_id
     
     def add_device(self, hostname: str, mgmt_ip: str = None, device_type: str = None, platform: str = None):
         """Add a device to the topology"""
         if hostname not in self.devices:
+            self.intern(hostname)
             self.devices[hostname] = Device(
                 hostname=hostname,
                 mgmt_ip=mgmt_ip,
@@ -62,6 +163,235 @@ class Topology:
         
         # Add link to local device
         self.devices[link.local_device].links.append(link)
+        
+        # Record the link with canonical endpoint order so A-B and B-A match
+        a = self.intern(link.local_device)
+        b = self.intern(link.remote_device)
+        self.link_set.add((a, b) if a < b else (b, a))
+
+
+class ConnectionPool:
+    """
+    Authenticated SSH sessions kept open for reuse across discoveries
+    
+    Sessions are checked out with acquire() and handed back with release();
+    a session is only ever used by one probe at a time. Idle sessions are
+    closed once unused for idle_timeout seconds or older than max_age, and
+    the least recently used one is dropped when more than max_size are idle.
+    """
+    
+    def __init__(self, max_size: int = CONNECTION_POOL_MAX_SIZE,
+                 idle_timeout: float = CONNECTION_POOL_IDLE_TIMEOUT,
+                 max_age: float = CONNECTION_POOL_MAX_AGE,
+                 max_handshakes: int = MAX_CONCURRENT_HANDSHAKES):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self._idle = {}  # key -> deque of (conn, created_at, last_used)
+        self._idle_count = 0
+        self._created = {}  # id(conn) -> created_at, for checked-out sessions
+        self._lock = threading.Lock()
+        self._handshakes = threading.Semaphore(max_handshakes)
+        self._reaper = None
+    
+    def acquire(self, key, connect):
+        """
+        Check out a session for key
+        
+        Args:
+            key: Pool key, e.g. (ip, device_type, credential fingerprint)
+            connect: Callable opening a new session when none is idle
+        """
+        while True:
+            with self._lock:
+                entry = self._pop_idle(key)
+            if entry is None:
+                break
+            
+            conn, created_at, _ = entry
+            if time.monotonic() - created_at < self.max_age and self._is_alive(conn):
+                logger.info(f"Reusing pooled session for {key[0]}")
+                with self._lock:
+                    self._created[id(conn)] = created_at
+                return conn
+            self._close(conn)
+        
+        with self._handshakes:
+            conn = connect()
+        with self._lock:
+            self._created[id(conn)] = time.monotonic()
+        return conn
+    
+    def release(self, key, conn):
+        """Return a healthy session to the pool"""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            created_at = self._created.pop(id(conn), now)
+            if self.max_size <= 0 or now - created_at >= self.max_age:
+                evicted.append(conn)
+            else:
+                self._idle.setdefault(key, deque()).append((conn, created_at, now))
+                self._idle_count += 1
+                while self._idle_count > self.max_size:
+                    evicted.append(self._pop_lru())
+            self._schedule_reaper()
+        for stale in evicted:
+            self._close(stale)
+    
+    def discard(self, conn):
+        """Close a checked-out session instead of returning it"""
+        with self._lock:
+            self._created.pop(id(conn), None)
+        self._close(conn)
+    
+    def __len__(self) -> int:
+        """Number of idle sessions"""
+        with self._lock:
+            return self._idle_count
+    
+    def close_all(self):
+        """Close every idle session"""
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn, _, _ in idle]
+            self._idle.clear()
+            self._idle_count = 0
+        for conn in conns:
+            self._close(conn)
+    
+    def _pop_idle(self, key):
+        """Take the most recently used idle session for key (lock held)"""
+        idle = self._idle.get(key)
+        if not idle:
+            return None
+        entry = idle.pop()
+        if not idle:
+            del self._idle[key]
+        self._idle_count -= 1
+        return entry
+    
+    def _pop_lru(self):
+        """Remove and return the least recently used idle session (lock held)"""
+        key = min(self._idle, key=lambda k: self._idle[k][0][2])
+        idle = self._idle[key]
+        conn = idle.popleft()[0]
+        if not idle:
+            del self._idle[key]
+        self._idle_count -= 1
+        return conn
+    
+    def _schedule_reaper(self):
+        """Start the idle reaper if sessions are waiting and none is pending (lock held)"""
+        if self._reaper is None and self._idle_count:
+            self._reaper = threading.Timer(min(self.idle_timeout, self.max_age), self._reap)
+            self._reaper.daemon = True
+            self._reaper.start()
+    
+    def _reap(self):
+        """Close idle sessions past idle_timeout or max_age"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            self._reaper = None
+            for key in list(self._idle):
+                keep = deque()
+                for conn, created_at, last_used in self._idle[key]:
+                    if now - last_used >= self.idle_timeout or now - created_at >= self.max_age:
+                        expired.append(conn)
+                    else:
+                        keep.append((conn, created_at, last_used))
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+            self._idle_count -= len(expired)
+            self._schedule_reaper()
+        for conn in expired:
+            self._close(conn)
+    
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        """Check that a pooled session still has a usable transport"""
+        is_alive = getattr(conn, 'is_alive', None)
+        if is_alive is None:
+            return True
+        try:
+            return is_alive()
+        except Exception:
+            return False
+    
+    @staticmethod
+    def _close(conn):
+        """Disconnect a session, ignoring errors from dead transports"""
+        try:
+            conn.disconnect()
+        except Exception as e:
+            logger.warning(f"Error while disconnecting: {e}")
+
+
+# Process-wide pool used unless a discoverer is given its own
+connection_pool = ConnectionPool()
+
+
+class NeighborCache:
+    """
+    Recent probe results shared by every discovery in this process
+    
+    Entries map (ip, device_type, credential fingerprint) to the hostname and
+    merged neighbor list seen at probe time. Overlapping discoveries within
+    the TTL skip SSH for devices already probed. The fingerprint ties a
+    result to the credentials that produced it.
+    
+    Entries are kept oldest first, so every put() drops the expired ones
+    from the front, then the oldest ones beyond max_size.
+    """
+    
+    def __init__(self, ttl: int = NEIGHBOR_CACHE_TTL, max_size: int = NEIGHBOR_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (stored_at, hostname, neighbors), oldest first
+        self._lock = threading.Lock()
+    
+    def get(self, key) -> Optional[Tuple[str, List[Neighbor]]]:
+        """Return (hostname, neighbors) if a fresh entry exists"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, hostname, neighbors = entry
+            if time.monotonic() - stored_at >= self.ttl:
+                del self._entries[key]
+                return None
+            return hostname, neighbors
+    
+    def put(self, key, hostname: str, neighbors: List[Neighbor]):
+        """Store a probe result"""
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries
+            entries[key] = (now, hostname, neighbors)
+            entries.move_to_end(key)
+            while entries:
+                stored_at = next(iter(entries.values()))[0]
+                if now - stored_at < self.ttl and len(entries) <= self.max_size:
+                    break
+                entries.popitem(last=False)
+    
+    def __len__(self) -> int:
+        """Number of entries held, including expired ones not yet dropped"""
+        with self._lock:
+            return len(self._entries)
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Process-wide cache used unless a discoverer is given its own
+neighbor_cache = NeighborCache()
 
 
 class DiscoveryError(Exception):
@@ -75,9 +405,18 @@ class DiscoveryError(Exception):
 class TopologyDiscoverer:
     """Discovers network topology recursively"""
     
-    def __init__(self, device_detector: DeviceTypeDetector, max_depth: int = 3, filters: dict = None):
+    def __init__(self, device_detector: DeviceTypeDetector, max_depth: int = 3, filters: dict = None,
+                 max_workers: int = DEFAULT_MAX_WORKERS, cache: NeighborCache = None, pool: ConnectionPool = None,
+                 refresh: bool = False):
         self.detector = device_detector
         self.max_depth = max_depth
+        self.max_workers = max_workers  # Devices probed concurrently per BFS level
+        self.cache = cache if cache is not None else neighbor_cache
+        self.refresh = refresh  # Probe every device even if cached; fresh results still get cached
+        self.pool = pool if pool is not None else connection_pool
+        # The cache answers for a device until its TTL runs out and only then is
+        # the pool consulted, so a session idling out before that is never reused
+        self.reuse_sessions = self.cache.ttl <= 0 or self.pool.idle_timeout > self.cache.ttl
         self.filters = filters or {
             'include_routers': True,
             'include_switches': True,
@@ -89,6 +428,7 @@ class TopologyDiscoverer:
         self.topology = Topology()
         self.visited: Set[str] = set()
         self.failed: Dict[str, str] = {}  # Track failed devices {ip: reason}
+        self._type_cache: Dict[tuple, Optional[str]] = {}  # (platform, caps, desc) -> device type
         self.credentials = {}
         logger.info(f"TopologyDiscoverer initialized with filters: {self.filters}")
     
@@ -96,6 +436,10 @@ class TopologyDiscoverer:
         """
         Start topology discovery from a seed device
         
+        Devices on the same BFS level are probed concurrently in a pool of
+        max_workers threads. No event loop is involved, so overlapping calls
+        from greenlets (gunicorn's gevent workers) don't collide.
+        
         Args:
             seed_ip: IP address of seed device
             seed_device_type: Netmiko device type for seed
@@ -105,95 +449,187 @@ class TopologyDiscoverer:
         Returns:
             Discovered Topology object
         """
+        frontier_ips, frontier_types = self._start(seed_ip, seed_device_type, username, password)
+        enqueued: Set[Union[int, bytes, str]] = {_canon(seed_ip)}  # Canonical key of every IP ever pushed
+        depth = 0
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while frontier_ips and self._within_depth(depth, frontier_ips):
+                level_ips, level_types = self._next_level(frontier_ips, frontier_types, depth)
+                futures = [executor.submit(self._probe, ip, device_type)
+                           for ip, device_type in zip(level_ips, level_types)]
+                results = [_outcome(future) for future in futures]
+                frontier_ips, frontier_types = self._merge_level(level_ips, level_types, results, depth, enqueued)
+                depth += 1
+        
+        return self._finish()
+    
+    def _start(self, seed_ip: str, seed_device_type: str, username: str, password: str) -> Tuple[List[str], List[str]]:
+        """
+        Reset per-discovery state
+        
+        Returns:
+            The first frontier, as parallel lists of IPs and device types
+        """
         self.credentials = {'username': username, 'password': password}
+        self._credential_key = hashlib.sha256(f"{username}\0{password}".encode()).hexdigest()
         self.topology = Topology()
         self.visited = set()
         
-        # Queue: (ip, device_type, depth)
-        queue = deque([(seed_ip, seed_device_type, 0)])
-        
         logger.info(f"Starting discovery from {seed_ip} (type: {seed_device_type})")
+        return [seed_ip], [sys.intern(seed_device_type)]
+    
+    def _finish(self) -> Topology:
+        """Log the discovery summary and return the topology"""
+        logger.info(f"Discovery complete. Found {len(self.topology.devices)} devices, {len(self.failed)} failed")
+        if self.failed:
+            logger.warning(f"Failed devices: {self.failed}")
+        return self.topology
+    
+    def _within_depth(self, depth: int, frontier_ips: List[str]) -> bool:
+        """True if the frontier at this depth should still be probed"""
+        if depth > self.max_depth:
+            logger.info(f"Depth {depth} exceeds max_depth {self.max_depth}, skipping {len(frontier_ips)} devices")
+            return False
+        return True
+    
+    def _next_level(self, frontier_ips: List[str], frontier_types: List[str], depth: int) -> Tuple[List[str], List[str]]:
+        """Mark the frontier visited and return the devices left to probe"""
+        # Safety net: frontier entries are already deduplicated at push time
+        level_ips = []
+        level_types = []
+        for ip, device_type in zip(frontier_ips, frontier_types):
+            if ip in self.visited:
+                logger.info(f"Already visited {ip}, skipping")
+                continue
+            self.visited.add(ip)
+            level_ips.append(ip)
+            level_types.append(device_type)
         
-        while queue:
-            ip, device_type, depth = queue.popleft()
-            
-            logger.info(f"Queue size: {len(queue)} | Processing: {ip} at depth {depth}")
+        logger.info(f"Discovering {len(level_ips)} devices at depth {depth}")
+        return level_ips, level_types
+    
+    def _merge_level(self, level_ips: List[str], level_types: List[str], results: list, depth: int,
+                     enqueued: Set[Union[int, bytes, str]]) -> Tuple[List[str], List[str]]:
+        """
+        Add one level's probe results to the topology, in frontier order
+        
+        Args:
+            results: (hostname, neighbors) or the exception raised, per device
+            enqueued: Canonical keys of every IP ever queued, updated in place
             
-            # Skip if already visited or too deep
-            if ip in self.visited or depth > self.max_depth:
-                if ip in self.visited:
-                    logger.info(f"Already visited {ip}, skipping")
-                if depth > self.max_depth:
-                    logger.info(f"Depth {depth} exceeds max_depth {self.max_depth}, skipping")
+        Returns:
+            The next frontier, as parallel lists of IPs and device types
+        """
+        frontier_ips = []
+        frontier_types = []
+        for ip, device_type, result in zip(level_ips, level_types, results):
+            if isinstance(result, DiscoveryError):
+                logger.error(f"Discovery error for {ip}: {result.message}")
+                self.failed[ip] = result.message
                 continue
+            if isinstance(result, BaseException):
+                logger.error(f"Unexpected error discovering {ip}: {result}")
+                self.failed[ip] = str(result)
+                continue
+            hostname, neighbors = result
             
-            self.visited.add(ip)
-            logger.info(f"Discovering {ip} at depth {depth}")
+            # Add device to topology
+            self.topology.add_device(hostname, ip, device_type)
             
-            try:
-                # Connect to device
-                conn = self._connect(ip, device_type)
+            # Process each neighbor
+            for neighbor in neighbors:
+                # Determine device type for neighbor (includes filtering)
+                neighbor_device_type = self._detect_neighbor_type(neighbor)
                 
-                # Get hostname
-                hostname = self._get_hostname(conn)
-                logger.info(f"Connected to {hostname} ({ip})")
+                # Log what we found
+                logger.info(f"Neighbor: {neighbor.remote_device or 'Unknown'} - Type: {neighbor_device_type} - Caps: {neighbor.remote_capabilities}")
                 
-                # Add device to topology
-                self.topology.add_device(hostname, ip, device_type)
+                # Skip if filtered out (detect_neighbor_type returns None for filtered devices)
+                if not neighbor_device_type:
+                    logger.info(f"⊗ Skipping {neighbor.remote_device or 'Unknown'}: filtered out or no device type detected")
+                    continue
                 
-                # Discover neighbors
-                neighbors = self._discover_neighbors(conn, hostname)
+                # Create link (only for devices that pass the filter)
+                link = Link(
+                    local_device=hostname,
+                    local_intf=neighbor.local_intf or '?',
+                    remote_device=neighbor.remote_device or 'Unknown',
+                    remote_intf=neighbor.remote_intf or '?',
+                    remote_ip=neighbor.remote_ip,
+                    protocols=protocols_of(neighbor.protocols_mask)
+                )
+                self.topology.add_link(link)
+                logger.info(f"✓ Added link: {hostname} ↔ {link.remote_device}")
                 
-                # Process each neighbor
-                for neighbor in neighbors:
-                    # Determine device type for neighbor (includes filtering)
-                    neighbor_device_type = self._detect_neighbor_type(neighbor)
-                    
-                    # Log what we found
-                    logger.info(f"Neighbor: {neighbor.get('remote_device', 'Unknown')} - Type: {neighbor_device_type} - Caps: {neighbor.get('remote_capabilities', 'None')}")
-                    
-                    # Skip if filtered out (detect_neighbor_type returns None for filtered devices)
-                    if not neighbor_device_type:
-                        logger.info(f"⊗ Skipping {neighbor.get('remote_device', 'Unknown')}: filtered out or no device type detected")
-                        continue
-                    
-                    # Create link (only for devices that pass the filter)
-                    link = Link(
-                        local_device=hostname,
-                        local_intf=neighbor.get('local_intf', '?'),
-                        remote_device=neighbor.get('remote_device', 'Unknown'),
-                        remote_intf=neighbor.get('remote_intf', '?'),
-                        remote_ip=neighbor.get('remote_ip'),
-                        protocols=neighbor.get('protocols', [])
-                    )
-                    self.topology.add_link(link)
-                    logger.info(f"✓ Added link: {hostname} ↔ {neighbor.get('remote_device', 'Unknown')}")
-                    
-                    # Queue for discovery if we have an IP
-                    if neighbor.get('remote_ip'):
-                        if neighbor['remote_ip'] not in self.visited:
-                            queue.append((neighbor['remote_ip'], neighbor_device_type, depth + 1))
-                            logger.info(f"→ Queued {neighbor['remote_device']} ({neighbor['remote_ip']}) as {neighbor_device_type} for depth {depth + 1}")
-                        else:
-                            logger.info(f"⊗ Already visited {neighbor['remote_ip']}")
+                # Queue for discovery if we have an IP and it was never queued.
+                # Neighbors past max_depth stay in the topology as leaves.
+                remote_ip = neighbor.remote_ip
+                remote_device = neighbor.remote_device
+                if depth >= self.max_depth:
+                    logger.info(f"⊗ Not queuing {remote_device}: max_depth {self.max_depth} reached")
+                elif remote_ip:
+                    key = _canon(remote_ip)
+                    if key in enqueued:
+                        logger.info(f"⊗ Already visited or queued {remote_ip}")
                     else:
-                        logger.info(f"⊗ Not queuing {neighbor.get('remote_device', 'Unknown')}: no IP address")
-                
-                conn.disconnect()
-                
-            except DiscoveryError as e:
-                logger.error(f"Discovery error for {ip}: {e.message}")
-                self.failed[ip] = e.message
-                continue
-            except Exception as e:
-                logger.error(f"Unexpected error discovering {ip}: {e}")
-                self.failed[ip] = str(e)
-                continue
+                        enqueued.add(key)
+                        frontier_ips.append(remote_ip)
+                        frontier_types.append(sys.intern(neighbor_device_type))
+                        logger.info(f"→ Queued {remote_device} ({remote_ip}) as {neighbor_device_type} for depth {depth + 1}")
+                else:
+                    logger.info(f"⊗ Not queuing {remote_device or 'Unknown'}: no IP address")
         
-        logger.info(f"Discovery complete. Found {len(self.topology.devices)} devices, {len(self.failed)} failed")
-        if self.failed:
-            logger.warning(f"Failed devices: {self.failed}")
-        return self.topology
+        return frontier_ips, frontier_types
+    
+    def _probe(self, ip: str, device_type: str) -> Tuple[str, List[Neighbor]]:
+        """
+        Connect to a single device and collect its neighbors
+        
+        Runs in a worker thread, so it must not touch the shared topology.
+        
+        Returns:
+            (hostname, merged neighbor list)
+        """
+        logger.info(f"Discovering {ip}")
+        
+        cache_key = (ip, device_type, self._credential_key)
+        cached = None if self.refresh else self.cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Using cached neighbors for {cached[0]} ({ip})")
+            return cached
+        
+        with self._session(cache_key, ip, device_type) as conn:
+            # Get hostname
+            hostname = self._get_hostname(conn)
+            logger.info(f"Connected to {hostname} ({ip})")
+            
+            # Discover neighbors
+            neighbors = self._discover_neighbors(conn, hostname)
+        
+        self.cache.put(cache_key, hostname, neighbors)
+        return hostname, neighbors
+    
+    @contextmanager
+    def _session(self, key: tuple, ip: str, device_type: str):
+        """
+        Borrow a connection from the pool for the duration of a with block
+        
+        An idle pooled session is reused when there is one. On a clean exit
+        the connection goes back to the pool if sessions are being reused;
+        otherwise, or if the block raises (its channel state is then
+        unknown), it is disconnected.
+        """
+        conn = self.pool.acquire(key, lambda: self._connect(ip, device_type))
+        try:
+            yield conn
+        except BaseException:
+            self.pool.discard(conn)
+            raise
+        if self.reuse_sessions:
+            self.pool.release(key, conn)
+        else:
+            self.pool.discard(conn)
     
     def _connect(self, ip: str, device_type: str) -> ConnectHandler:
         """Connect to a device via SSH (or mock for testing)"""
@@ -247,11 +683,13 @@ class TopologyDiscoverer:
                     username=self.credentials['username'],
                     password=self.credentials['password'],
                     timeout=30,
+                    conn_timeout=10,
                     session_timeout=60,
                     auth_timeout=30,
-                    banner_timeout=20,
-                    fast_cli=False,
-                    global_delay_factor=2,
+                    banner_timeout=5,
+                    keepalive=30,  # Pooled sessions sit idle between discoveries
+                    fast_cli=True,
+                    global_delay_factor=0.1,
                 )
                 logger.info(f"✓ Successfully connected to {ip} using device_type={dt}")
                 return conn
@@ -274,42 +712,99 @@ class TopologyDiscoverer:
     
     def _get_hostname(self, conn: ConnectHandler) -> str:
         """Extract hostname from device prompt"""
+        if not isinstance(conn, MockNetworkDevice) and conn.base_prompt:
+            # Netmiko already read the prompt while preparing the session
+            # (which also disabled paging and widened the terminal)
+            return conn.base_prompt.strip()
         prompt = conn.find_prompt()
         # Remove trailing # or >
         hostname = prompt.rstrip('#>').strip()
         return hostname
     
-    def _discover_neighbors(self, conn: ConnectHandler, hostname: str) -> List[Dict]:
+    def _discover_neighbors(self, conn: ConnectHandler, hostname: str) -> List[Neighbor]:
         """Discover neighbors using CDP and LLDP"""
-        cdp_neighbors = []
-        lldp_neighbors = []
-        
-        # Try CDP
-        try:
-            cdp_output = conn.send_command("show cdp neighbors detail", read_timeout=30)
+        if isinstance(conn, MockNetworkDevice):
+            # Mock output is static and parsed once at import
+            cdp_neighbors = conn.get_parsed('cdp')
+            lldp_neighbors = conn.get_parsed('lldp')
+        else:
+            outputs = None
+            if conn.device_type in BATCHED_DEVICE_TYPES:
+                try:
+                    outputs = self._send_batched(conn, NEIGHBOR_COMMANDS, read_timeout=30)
+                except Exception as e:
+                    logger.warning(f"Batched neighbor commands failed on {hostname}: {e}, retrying one at a time")
+                    conn.clear_buffer()
+            if outputs is None:
+                # One command at a time, so one protocol failing (e.g. CDP hanging
+                # or disabled) doesn't cost us the other
+                outputs = [self._send_single(conn, command, hostname) for command in NEIGHBOR_COMMANDS]
+            cdp_output, lldp_output = outputs
+            
             cdp_neighbors = parse_cdp_neighbors_detail(cdp_output)
-            logger.info(f"Found {len(cdp_neighbors)} CDP neighbors on {hostname}")
-        except Exception as e:
-            logger.warning(f"CDP discovery failed on {hostname}: {e}")
-        
-        # Try LLDP
-        try:
-            lldp_output = conn.send_command("show lldp neighbors detail", read_timeout=30)
             lldp_neighbors = parse_lldp_neighbors_detail(lldp_output)
-            logger.info(f"Found {len(lldp_neighbors)} LLDP neighbors on {hostname}")
-        except Exception as e:
-            logger.warning(f"LLDP discovery failed on {hostname}: {e}")
+        
+        logger.info(f"Found {len(cdp_neighbors)} CDP neighbors on {hostname}")
+        logger.info(f"Found {len(lldp_neighbors)} LLDP neighbors on {hostname}")
         
         # Merge CDP and LLDP information
         merged = merge_neighbor_info(cdp_neighbors, lldp_neighbors)
         return merged
     
-    def _detect_neighbor_type(self, neighbor: Dict) -> Optional[str]:
+    def _send_single(self, conn: ConnectHandler, command: str, hostname: str) -> str:
+        """Run one show command, returning empty output if it fails"""
+        try:
+            return conn.send_command(command, read_timeout=30)
+        except Exception as e:
+            logger.warning(f"'{command}' failed on {hostname}: {e}")
+            return ""
+    
+    def _send_batched(self, conn: ConnectHandler, commands: List[str], read_timeout: int = 30) -> List[str]:
+        """
+        Run several show commands with a single channel write
+        
+        The commands are typed ahead so the device answers them back to back,
+        costing one round-trip instead of a prompt lookup and match per
+        command. The combined output is split on the prompt that follows
+        each command.
+        
+        Returns:
+            One output string per command, in order
+        """
+        # A prompt line is the hostname plus its terminator, optionally followed
+        # by the echo of the next typed-ahead command. Anchoring both ends keeps
+        # output lines that merely start with the hostname ("Device ID: ..."
+        # on a device named "Device") from being taken for prompts.
+        echoes = "|".join(re.escape(command) for command in commands)
+        prompt = rf"^{re.escape(conn.base_prompt)}[>#][^\S\n]*(?:{echoes})?[^\S\n]*$"
+        conn.write_channel("".join(conn.normalize_cmd(command) for command in commands))
+        output = conn.read_until_pattern(
+            pattern=f"(?:.*?{prompt}){{{len(commands)}}}",
+            read_timeout=read_timeout,
+            re_flags=re.M | re.S,
+        )
+        
+        # Each chunk starts with the rest of the line holding the echoed
+        # command, drop it
+        chunks = re.split(prompt, output, flags=re.M)[:len(commands)]
+        return [chunk.split("\n", 1)[1] if "\n" in chunk else "" for chunk in chunks]
+    
+    def _detect_neighbor_type(self, neighbor: Neighbor) -> Optional[str]:
         """Detect Netmiko device type for a neighbor"""
-        platform = neighbor.get('remote_platform', '')
-        capabilities = neighbor.get('remote_capabilities', '')
-        system_desc = neighbor.get('system_description', '')
+        platform = neighbor.remote_platform or ''
+        capabilities = neighbor.remote_capabilities or ''
+        system_desc = neighbor.system_description or ''
         
+        # The same platform strings repeat on every port of a neighbor, and
+        # filters are fixed for this discoverer, so each verdict is reusable
+        key = (platform, capabilities, system_desc)
+        if key in self._type_cache:
+            return self._type_cache[key]
+        device_type = self._type_cache[key] = self._detect_neighbor_type_uncached(platform, capabilities, system_desc)
+        return device_type
+    
+    def _detect_neighbor_type_uncached(self, platform: str, capabilities: str, system_desc: str) -> Optional[str]:
+        """Run CDP-then-LLDP detection through the device type detector"""
         # Try CDP-based detection first (has better platform info)
         if platform:
             device_type = self.detector.detect_from_cdp(platform, capabilities, self.filters)
@@ -325,6 +820,11 @@ class TopologyDiscoverer:
         return None
 
 
+def _protocol_label(protocols: List[str]) -> str:
+    """Bracketed protocol list for a tree edge, e.g. "[CDP+LLDP]" ("" if none)"""
+    return f"[{'+'.join(protocols)}]" if protocols else ""
+
+
 def render_topology_tree(topology: Topology, root: str = None) -> str:
     """
     Render topology as a text tree with interface and IP labels
@@ -336,39 +836,84 @@ def render_topology_tree(topology: Topology, root: str = None) -> str:
     Returns:
         Multi-line string representation
     """
+    return "\n".join(iter_topology_tree(topology, root))
+
+
+def iter_topology_tree(topology: Topology, root: str = None) -> Iterator[str]:
+    """
+    Yield the lines of render_topology_tree() one at a time, for streaming
+    
+    Args:
+        topology: Topology object
+        root: Root device hostname (if None, picks first device)
+        
+    Yields:
+        Tree lines, without trailing newlines
+    """
     if not topology.devices:
-        return "No devices discovered"
+        yield "No devices discovered"
+        return
     
-    # Build adjacency graph
-    adjacency = {}
-    link_details = {}  # Store link info for display
+    # Build adjacency graph; every device gets an entry, even without links
+    adjacency = defaultdict(set)
+    link_details = {}  # Store link info for display, keyed in both directions
+    devices = topology.devices
     
-    for device in topology.devices.values():
-        adjacency.setdefault(device.hostname, set())
+    for hostname, device in devices.items():
+        adjacency[hostname]
         for link in device.links:
-            adjacency[link.local_device].add(link.remote_device)
-            adjacency.setdefault(link.remote_device, set()).add(link.local_device)
+            local, remote = link.local_device, link.remote_device
+            adjacency[local].add(remote)
+            adjacency[remote].add(local)
             
-            # Store link details for both directions
-            key = (link.local_device, link.remote_device)
-            link_details[key] = {
+            # A link reported by the local device always wins; the mirrored
+            # entry only fills in when the far end never reported this link
+            link_details[(local, remote)] = {
                 'local_intf': link.local_intf,
                 'remote_intf': link.remote_intf,
                 'remote_ip': link.remote_ip,
                 'protocols': link.protocols
             }
+            link_details.setdefault((remote, local), {
+                'local_intf': link.remote_intf,
+                'remote_intf': link.local_intf,
+                'remote_ip': devices[local].mgmt_ip,
+                'protocols': link.protocols
+            })
     
     # Choose root
     if root is None:
         root = next(iter(adjacency))
     
-    # Build tree representation
-    lines = []
-    visited = set()
+    # Ids come from the topology, but a root outside it or a Topology built
+    # without add_device()/add_link() can name devices it never interned;
+    # number those locally rather than touch the caller's topology
+    name2id = topology.name2id
+    missing = [name for name in (*adjacency, root) if name not in name2id]
+    if missing:
+        name2id = dict(name2id)
+        for name in missing:
+            name2id.setdefault(name, len(name2id))
+    
+    # Sort each neighbor list once, paired with its device id; the walk below
+    # only filters out visited nodes
+    sorted_adjacency = {
+        node: tuple((neighbor, name2id[neighbor]) for neighbor in sorted(neighbors))
+        for node, neighbors in adjacency.items()
+    }
     
-    def build_tree(node: str, prefix: str = "", is_last: bool = True):
-        """Recursively build tree structure"""
-        visited.add(node)
+    # Build tree representation with an explicit stack instead of recursion.
+    # Entries: (node, prefix, is_last, connection line leading to node)
+    visited = bytearray((len(name2id) + 7) // 8)  # Bitmap indexed by device id
+    stack = [(root, "", True, None)]
+    
+    while stack:
+        node, prefix, is_last, connection_line = stack.pop()
+        if connection_line is not None:
+            yield connection_line
+        
+        node_id = name2id[node]
+        visited[node_id >> 3] |= 1 << (node_id & 7)
         
         # Add device with IP
         device = topology.devices.get(node)
@@ -376,35 +921,31 @@ def render_topology_tree(topology: Topology, root: str = None) -> str:
         if device and device.mgmt_ip:
             device_label = f"{node} ({device.mgmt_ip})"
         
-        lines.append(f"{prefix}{device_label}")
+        yield f"{prefix}{device_label}"
         
-        # Get unvisited neighbors
-        neighbors = sorted(adjacency.get(node, set()) - visited)
+        # Get unvisited neighbors (a root outside the topology has none)
+        neighbors = [
+            neighbor for neighbor, neighbor_id in sorted_adjacency.get(node, ())
+            if not visited[neighbor_id >> 3] & (1 << (neighbor_id & 7))
+        ]
         
+        children = []
+        child_prefix = prefix + _INDENT[is_last]
+        last = len(neighbors) - 1
         for i, neighbor in enumerate(neighbors):
-            is_last_neighbor = (i == len(neighbors) - 1)
+            is_last_neighbor = (i == last)
             
             # Get link details
-            link_info = link_details.get((node, neighbor), {})
-            local_intf = link_info.get('local_intf', '?')
-            remote_intf = link_info.get('remote_intf', '?')
-            remote_ip = link_info.get('remote_ip', '')
-            protocols = '+'.join(link_info.get('protocols', []))
-            
-            # Build connection line
-            connector = "└─" if is_last_neighbor else "├─"
-            protocol_label = f"[{protocols}]" if protocols else ""
+            link_info = link_details[(node, neighbor)]
+            remote_ip = link_info['remote_ip']
             
             # Show interface mapping
-            connection_line = f"{prefix}{'   ' if is_last else '│  '}{connector}{protocol_label} {local_intf} ↔ {remote_intf}"
+            child_line = (f"{child_prefix}{_CONN[is_last_neighbor]}{_protocol_label(link_info['protocols'])} "
+                          f"{link_info['local_intf']} ↔ {link_info['remote_intf']}")
             if remote_ip:
-                connection_line += f" ({remote_ip})"
-            
-            lines.append(connection_line)
+                child_line += f" ({remote_ip})"
             
-            # Recurse
-            new_prefix = prefix + ("   " if is_last else "│  ") + ("   " if is_last_neighbor else "│  ")
-            build_tree(neighbor, new_prefix, is_last_neighbor)
-    
-    build_tree(root)
-    return "\n".join(lines)
+            children.append((neighbor, child_prefix + _INDENT[is_last_neighbor], is_last_neighbor, child_line))
+        
+        # Push in reverse so the first neighbor is expanded first
+        stack.extend(reversed(children))
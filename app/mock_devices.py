@@ -3,8 +3,11 @@ Mock Network Simulator
 Simulates network devices for testing without real hardware
 """
 
+import dataclasses
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+
+from parsers import Neighbor, parse_cdp_neighbors_detail, parse_lldp_neighbors_detail
 
 logger = logging.getLogger(__name__)
 
@@ -330,11 +333,34 @@ Cisco IOS Software, C3750E Software (C3750E-UNIVERSALK9-M), Version 15.2(4)E8
         else:
             return ""
     
+    def get_parsed(self, protocol: str) -> List[Neighbor]:
+        """
+        Return the pre-parsed neighbors for this device
+        
+        Args:
+            protocol: 'cdp' or 'lldp'
+            
+        Returns:
+            Fresh copies of the neighbor records, safe for the caller to mutate
+        """
+        logger.info(f"[MOCK] Returning parsed {protocol.upper()} neighbors for {self.device_config['hostname']}")
+        return [dataclasses.replace(neighbor) for neighbor in _PARSED[self.host][protocol]]
+    
     def disconnect(self):
         """Simulate disconnect"""
         logger.info(f"[MOCK] Disconnected from {self.device_config['hostname']}")
 
 
+# Mock outputs never change, so parse them once at import
+_PARSED = {
+    host: {
+        'cdp': parse_cdp_neighbors_detail(config.get('cdp_output', '')),
+        'lldp': parse_lldp_neighbors_detail(config.get('lldp_output', '')),
+    }
+    for host, config in MockNetworkDevice.MOCK_DEVICES.items()
+}
+
+
 def is_mock_mode(host: str) -> bool:
     """Check if this IP should use mock mode"""
     return host in MockNetworkDevice.MOCK_DEVICES
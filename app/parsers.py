@@ -1,19 +1,180 @@
 """
 CDP and LLDP Neighbor Parsers
 Extract neighbor information from show command output
+
+Every string field of a parsed Neighbor except system_description is
+sys.intern()ed. The same hostnames, addresses and interfaces appear in both
+protocols' output, so merge_neighbor_info's dict lookups on remote_device /
+remote_ip compare keys by identity. Keep new fields interned too.
 """
 
 import logging
-from typing import List, Dict, Optional
+import re
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Header lines of interest in 'show cdp neighbors detail' output. One
+# finditer() pass over the whole output skips every other line in C, and
+# the value is captured already trimmed ([^\S\n] is the whitespace
+# str.strip() removes, minus the newline).
+_CDP_FIELD_RE = re.compile(
+    r"^[ \t]*(Device ID|IP address|IPv4 Address|Platform|Interface):[^\S\n]*(.*?)[^\S\n]*$",
+    re.MULTILINE,
+)
+_CAPABILITIES = "Capabilities:"
+_CAPABILITIES_LEN = len(_CAPABILITIES)
+
+# Bits of Neighbor.protocols_mask, one per protocol that reported the neighbor
+PROTOCOL_CDP = 1
+PROTOCOL_LLDP = 2
+
+# Protocol tags shared by every link, and the tag list for each mask value
+_CDP_TAG = sys.intern("CDP")
+_LLDP_TAG = sys.intern("LLDP")
+_PROTOCOLS_BY_MASK = ((), (_CDP_TAG,), (_LLDP_TAG,), (_CDP_TAG, _LLDP_TAG))
+
+# LLDP labels that start a field line, with their lengths so values can
+# be sliced off without splitting
+_LLDP_CHASSIS_ID = "Chassis id:"
+_LLDP_CHASSIS_ID_LEN = len(_LLDP_CHASSIS_ID)
+_LLDP_SYSTEM_NAME = "System Name:"
+_LLDP_SYSTEM_NAME_LEN = len(_LLDP_SYSTEM_NAME)
+_LLDP_PORT_ID = "Port id:"
+_LLDP_PORT_ID_LEN = len(_LLDP_PORT_ID)
+_LLDP_LOCAL_PORT_ID = "Local Port id:"
+_LLDP_LOCAL_PORT_ID_LEN = len(_LLDP_LOCAL_PORT_ID)
+_LLDP_SYSTEM_CAPABILITIES = "System Capabilities:"
+_LLDP_SYSTEM_CAPABILITIES_LEN = len(_LLDP_SYSTEM_CAPABILITIES)
+_LLDP_MGMT_IP = "IP:"
+_LLDP_MGMT_IP_LEN = len(_LLDP_MGMT_IP)
+
+# Lines that keep the management address section open
+_LLDP_MGMT_CONTINUE = ("IP", "IPv4", "IPv6", "Other")
+
+# Lines that end a multi-line LLDP system description. Most description
+# lines are rejected by a set lookup on their first four characters
+# before any prefix is compared.
+_LLDP_DESC_STOP = ("Time remaining", "System Capabilities", "Enabled Capabilities", "Management")
+_LLDP_DESC_STOP_HEADS = frozenset(prefix[:4] for prefix in _LLDP_DESC_STOP)
+
+# First characters of LLDP lines that can change parser state outside a
+# description or management section: indentation or a field label's initial
+_LLDP_LINE_STARTS = frozenset(" \tCSPLM")
+
+
+@dataclass(slots=True)
+class Neighbor:
+    """One CDP/LLDP neighbor; fields the output did not mention stay None"""
+    remote_device: Optional[str] = None
+    remote_ip: Optional[str] = None
+    remote_platform: Optional[str] = None
+    remote_capabilities: Optional[str] = None
+    local_intf: Optional[str] = None
+    remote_intf: Optional[str] = None
+    system_description: Optional[str] = None
+    protocols_mask: int = 0  # PROTOCOL_CDP | PROTOCOL_LLDP bits, set by merge_neighbor_info
+    
+    def is_empty(self) -> bool:
+        """True while no field has been parsed into this record"""
+        return (self.remote_device is None and self.remote_ip is None
+                and self.remote_platform is None and self.remote_capabilities is None
+                and self.local_intf is None and self.remote_intf is None
+                and self.system_description is None)
+
+
+def protocols_of(mask: int) -> List[str]:
+    """Protocol names for a protocols_mask, e.g. ['CDP', 'LLDP']"""
+    return list(_PROTOCOLS_BY_MASK[mask])
+
+
+def _iter_lines(text: str) -> Iterator[str]:
+    """
+    Yield the lines of text one at a time without building a list
+    
+    Only '\n' ends a line; Netmiko already normalizes line endings, and a
+    leftover '\r' is removed by the callers' strip().
+    """
+    pos = 0
+    end = len(text)
+    while pos < end:
+        newline = text.find('\n', pos)
+        if newline < 0:
+            yield text[pos:]
+            return
+        yield text[pos:newline]
+        pos = newline + 1
+
+
+def _cdp_device_id(value: str, current: Neighbor, neighbors: List[Neighbor]) -> Neighbor:
+    """Close the current neighbor and start a new one"""
+    if not current.is_empty():
+        neighbors.append(current)
+    # Sometimes includes domain, strip it
+    dot = value.find('.')
+    return Neighbor(remote_device=sys.intern(value[:dot] if dot >= 0 else value))
+
+
+def _cdp_platform(value: str, current: Neighbor, neighbors: List[Neighbor]) -> Neighbor:
+    """Platform and capabilities"""
+    comma = value.find(",")
+    current.remote_platform = sys.intern((value[:comma] if comma >= 0 else value).strip())
+    
+    # Capabilities might be on same line. Take them from the last
+    # comma-separated part that has the label, up to the part's end.
+    last = value.rfind(_CAPABILITIES)
+    if last >= 0:
+        start = value.find(_CAPABILITIES, value.rfind(",", 0, last) + 1) + _CAPABILITIES_LEN
+        end = value.find(",", start)
+        if end < 0:
+            end = len(value)
+        repeat = value.find(_CAPABILITIES, start, end)
+        if repeat >= 0:
+            end = repeat
+        current.remote_capabilities = sys.intern(value[start:end].strip())
+    return current
+
+
+def _cdp_interface(value: str, current: Neighbor, neighbors: List[Neighbor]) -> Neighbor:
+    """Interface mapping"""
+    # Format: "Interface: GigabitEthernet1/0/1,  Port ID (outgoing port): GigabitEthernet0/1"
+    comma = value.find(",")
+    if comma < 0:
+        current.local_intf = sys.intern(value)
+        return current
+    current.local_intf = sys.intern(value[:comma].strip())
+    
+    end = value.find(",", comma + 1)
+    port = value[comma + 1:end] if end >= 0 else value[comma + 1:]
+    if "Port ID" in port:
+        current.remote_intf = sys.intern(port[port.rfind(":") + 1:].strip())
+    return current
+
+
+def _cdp_ip_address(value: str, current: Neighbor, neighbors: List[Neighbor]) -> Neighbor:
+    """Management IP ("IP address:" on IOS, "IPv4 Address:" on NX-OS)"""
+    if value and not value.startswith("("):  # Skip "(not available)" or similar
+        current.remote_ip = sys.intern(value)
+    return current
+
+
+# Field name -> handler; each returns the neighbor record now being filled
+_CDP_HANDLERS = {
+    "Device ID": _cdp_device_id,
+    "Platform": _cdp_platform,
+    "Interface": _cdp_interface,
+    "IP address": _cdp_ip_address,
+    "IPv4 Address": _cdp_ip_address,
+}
 
-def parse_cdp_neighbors_detail(output: str) -> List[Dict[str, str]]:
+
+def parse_cdp_neighbors_detail(output: str) -> List[Neighbor]:
     """
     Parse 'show cdp neighbors detail' output
     
-    Returns list of neighbor dicts with keys:
+    Returns list of Neighbor records with fields:
     - remote_device: Neighbor hostname
     - remote_ip: Management IP address
     - remote_platform: Platform string
@@ -22,71 +183,30 @@ def parse_cdp_neighbors_detail(output: str) -> List[Dict[str, str]]:
     - remote_intf: Remote interface
     """
     neighbors = []
-    current = {}
+    current = Neighbor()
     
-    for line in output.splitlines():
-        line_stripped = line.strip()
-        
-        # New neighbor entry
-        if line_stripped.startswith("Device ID:"):
-            if current:
-                neighbors.append(current)
-                current = {}
-            device_id = line_stripped.split("Device ID:")[1].strip()
-            # Sometimes includes domain, strip it
-            current["remote_device"] = device_id.split('.')[0]
-        
-        # IP address (multiple formats: "IP address:", "IPv4 Address:", etc.)
-        elif "IP address:" in line_stripped or "IPv4 Address:" in line_stripped:
-            # Handle both "IP address: X.X.X.X" and "IPv4 Address: X.X.X.X"
-            if "IPv4 Address:" in line_stripped:
-                ip = line_stripped.split("IPv4 Address:")[1].strip()
-            else:
-                ip = line_stripped.split("IP address:")[1].strip()
-            
-            if ip and not ip.startswith("("):  # Skip "(not available)" or similar
-                current["remote_ip"] = ip
-        
-        # Platform and capabilities
-        elif line_stripped.startswith("Platform:"):
-            parts = line_stripped.split(",")
-            platform = parts[0].split("Platform:")[1].strip()
-            current["remote_platform"] = platform
-            
-            # Capabilities might be on same line
-            for part in parts:
-                if "Capabilities:" in part:
-                    caps = part.split("Capabilities:")[1].strip()
-                    current["remote_capabilities"] = caps
-        
-        # Interface mapping
-        elif line_stripped.startswith("Interface:"):
-            # Format: "Interface: GigabitEthernet1/0/1,  Port ID (outgoing port): GigabitEthernet0/1"
-            parts = line_stripped.split(",")
-            local_intf = parts[0].split("Interface:")[1].strip()
-            current["local_intf"] = local_intf
-            
-            if len(parts) > 1 and "Port ID" in parts[1]:
-                remote_intf = parts[1].split(":")[-1].strip()
-                current["remote_intf"] = remote_intf
+    for match in _CDP_FIELD_RE.finditer(output):
+        key, value = match.groups()
+        current = _CDP_HANDLERS[key](value, current, neighbors)
     
     # Don't forget the last neighbor
-    if current:
+    if not current.is_empty():
         neighbors.append(current)
     
     # Log what we extracted
     logger.info(f"Parsed {len(neighbors)} CDP neighbors")
-    for i, n in enumerate(neighbors):
-        logger.debug(f"  CDP Neighbor {i+1}: {n.get('remote_device', '?')} - IP: {n.get('remote_ip', 'MISSING')} - Platform: {n.get('remote_platform', '?')}")
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, n in enumerate(neighbors):
+            logger.debug(f"  CDP Neighbor {i+1}: {n.remote_device or '?'} - IP: {n.remote_ip or 'MISSING'} - Platform: {n.remote_platform or '?'}")
     
     return neighbors
 
 
-def parse_lldp_neighbors_detail(output: str) -> List[Dict[str, str]]:
+def parse_lldp_neighbors_detail(output: str) -> List[Neighbor]:
     """
     Parse 'show lldp neighbors detail' output
     
-    Returns list of neighbor dicts with keys:
+    Returns list of Neighbor records with fields:
     - remote_device: Neighbor hostname
     - remote_ip: Management IP address  
     - remote_platform: Chassis ID (used as platform identifier)
@@ -96,117 +216,143 @@ def parse_lldp_neighbors_detail(output: str) -> List[Dict[str, str]]:
     - system_description: System description string
     """
     neighbors = []
-    current = {}
+    current = Neighbor()
     in_mgmt_addresses = False
+    collecting_desc = False
+    # Local aliases for the per-line hot path
+    intern = sys.intern
+    neighbors_append = neighbors.append
     
-    for line in output.splitlines():
+    for line in _iter_lines(output):
+        # Skip lines that cannot match anything, before paying for strip()
+        # where possible
+        if not line:
+            continue
+        idle = not in_mgmt_addresses and not collecting_desc
+        if idle and line[0] not in _LLDP_LINE_STARTS:
+            continue
         line_stripped = line.strip()
+        if not line_stripped or (idle and line_stripped[0] not in _LLDP_LINE_STARTS):
+            continue
+        startswith = line_stripped.startswith
         
         # New neighbor entry
-        if line_stripped.startswith("Chassis id:"):
-            if current:
-                neighbors.append(current)
-                current = {}
-            in_mgmt_addresses = False
-            current["remote_platform"] = line_stripped.split("Chassis id:")[1].strip()
+        if startswith(_LLDP_CHASSIS_ID):
+            if not current.is_empty():
+                neighbors_append(current)
+                current = Neighbor()
+            in_mgmt_addresses = collecting_desc = False
+            current.remote_platform = intern(line_stripped[_LLDP_CHASSIS_ID_LEN:].strip())
         
         # System Name (hostname)
-        elif line_stripped.startswith("System Name:"):
-            name = line_stripped.split("System Name:")[1].strip()
+        elif startswith(_LLDP_SYSTEM_NAME):
+            name = line_stripped[_LLDP_SYSTEM_NAME_LEN:].strip()
             # Strip domain if present
-            current["remote_device"] = name.split('.')[0]
-            in_mgmt_addresses = False
+            dot = name.find('.')
+            current.remote_device = intern(name[:dot] if dot >= 0 else name)
+            in_mgmt_addresses = collecting_desc = False
         
         # Remote interface
-        elif line_stripped.startswith("Port id:"):
-            current["remote_intf"] = line_stripped.split("Port id:")[1].strip()
-            in_mgmt_addresses = False
+        elif startswith(_LLDP_PORT_ID):
+            current.remote_intf = intern(line_stripped[_LLDP_PORT_ID_LEN:].strip())
+            in_mgmt_addresses = collecting_desc = False
         
         # Local interface
-        elif line_stripped.startswith("Local Port id:"):
-            current["local_intf"] = line_stripped.split("Local Port id:")[1].strip()
-            in_mgmt_addresses = False
+        elif startswith(_LLDP_LOCAL_PORT_ID):
+            current.local_intf = intern(line_stripped[_LLDP_LOCAL_PORT_ID_LEN:].strip())
+            in_mgmt_addresses = collecting_desc = False
         
         # System Description (contains platform info)
-        elif line_stripped.startswith("System Description:"):
+        elif startswith("System Description:"):
             in_mgmt_addresses = False
-            # Description might continue on next lines
-            current["system_description"] = ""
-        elif "system_description" in current and line_stripped and not line_stripped.startswith(("Time remaining", "System Capabilities", "Enabled Capabilities", "Management")):
-            # Accumulate multi-line description
-            if current["system_description"]:
-                current["system_description"] += " "
-            current["system_description"] += line_stripped
+            # Description continues on the following lines
+            collecting_desc = True
+            current.system_description = ""
         
         # System Capabilities
-        elif line_stripped.startswith("System Capabilities:"):
-            caps = line_stripped.split("System Capabilities:")[1].strip()
-            current["remote_capabilities"] = caps
-            in_mgmt_addresses = False
+        elif startswith(_LLDP_SYSTEM_CAPABILITIES):
+            current.remote_capabilities = intern(line_stripped[_LLDP_SYSTEM_CAPABILITIES_LEN:].strip())
+            in_mgmt_addresses = collecting_desc = False
         
         # Management Address section
-        elif line_stripped.startswith("Management Addresses:") or line_stripped.startswith("Management Address:"):
+        elif startswith("Management Addresses:") or startswith("Management Address:"):
             in_mgmt_addresses = True
+            collecting_desc = False
+        
+        # Multi-line description, up to the next field line
+        elif collecting_desc and line_stripped:
+            if line_stripped[:4] in _LLDP_DESC_STOP_HEADS and startswith(_LLDP_DESC_STOP):
+                collecting_desc = False
+            else:
+                if current.system_description:
+                    current.system_description += " "
+                current.system_description += line_stripped
         
         # IP address in management section
-        elif in_mgmt_addresses and line_stripped.startswith("IP:"):
-            ip_addr = line_stripped.split("IP:")[1].strip()
+        elif in_mgmt_addresses and startswith(_LLDP_MGMT_IP):
+            ip_addr = line_stripped[_LLDP_MGMT_IP_LEN:].strip()
             if ip_addr:
-                current["remote_ip"] = ip_addr
+                current.remote_ip = intern(ip_addr)
         
         # End of management addresses section
         elif line_stripped and in_mgmt_addresses:
-            if not any(line_stripped.startswith(x) for x in ["IP", "IPv4", "IPv6", "Other"]):
+            if not startswith(_LLDP_MGMT_CONTINUE):
                 in_mgmt_addresses = False
     
     # Don't forget the last neighbor
-    if current:
-        neighbors.append(current)
+    if not current.is_empty():
+        neighbors_append(current)
     
     # Log what we extracted
     logger.info(f"Parsed {len(neighbors)} LLDP neighbors")
-    for i, n in enumerate(neighbors):
-        logger.debug(f"  LLDP Neighbor {i+1}: {n.get('remote_device', '?')} - IP: {n.get('remote_ip', 'MISSING')}")
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, n in enumerate(neighbors):
+            logger.debug(f"  LLDP Neighbor {i+1}: {n.remote_device or '?'} - IP: {n.remote_ip or 'MISSING'}")
     
     return neighbors
 
 
-def merge_neighbor_info(cdp_neighbors: List[Dict], lldp_neighbors: List[Dict]) -> List[Dict]:
+def merge_neighbor_info(cdp_neighbors: List[Neighbor], lldp_neighbors: List[Neighbor]) -> List[Neighbor]:
     """
     Merge CDP and LLDP neighbor information
     Prioritize CDP for platform info, but use LLDP if CDP is missing
     
     Returns: Deduplicated list of neighbors with best available info
     """
-    merged = {}
+    merged: Dict[str, Neighbor] = {}  # Interned remote_device or remote_ip -> neighbor
     
     # Process CDP neighbors first (usually more detailed platform info)
     for neighbor in cdp_neighbors:
-        key = neighbor.get('remote_device', '') or neighbor.get('remote_ip', '')
+        key = neighbor.remote_device or neighbor.remote_ip
         if key:
+            neighbor.protocols_mask = PROTOCOL_CDP
             merged[key] = neighbor
-            merged[key]['protocols'] = ['CDP']
     
     # Add or merge LLDP neighbors
     for neighbor in lldp_neighbors:
-        key = neighbor.get('remote_device', '') or neighbor.get('remote_ip', '')
+        key = neighbor.remote_device or neighbor.remote_ip
         if not key:
             continue
         
-        if key in merged:
-            # Merge: fill in missing fields from LLDP
-            for field in ['remote_ip', 'remote_intf', 'local_intf']:
-                if field not in merged[key] and field in neighbor:
-                    merged[key][field] = neighbor[field]
-            merged[key]['protocols'].append('LLDP')
-            
-            # Use LLDP system description if we don't have good platform info
-            if 'system_description' in neighbor and neighbor['system_description']:
-                merged[key]['system_description'] = neighbor['system_description']
-        else:
+        existing = merged.get(key)
+        if existing is None:
             # New neighbor only in LLDP
-            neighbor['protocols'] = ['LLDP']
+            neighbor.protocols_mask = PROTOCOL_LLDP
             merged[key] = neighbor
+            continue
+        
+        # Merge: fill in missing fields from LLDP
+        if existing.remote_ip is None:
+            existing.remote_ip = neighbor.remote_ip
+        if existing.remote_intf is None:
+            existing.remote_intf = neighbor.remote_intf
+        if existing.local_intf is None:
+            existing.local_intf = neighbor.local_intf
+        existing.protocols_mask |= PROTOCOL_LLDP
+        
+        # Use LLDP system description if we don't have good platform info
+        if neighbor.system_description:
+            existing.system_description = neighbor.system_description
     
     result = list(merged.values())
     logger.info(f"Merged to {len(result)} unique neighbors")
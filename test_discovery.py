@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the discovery engine
+Run with pytest from the repository root
+"""
+
+import re
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+sys.path.insert(0, 'app')
+
+from device_detector import DeviceTypeDetector
+import discovery
+from discovery import (NEIGHBOR_COMMANDS, ConnectionPool, Device, Link, NeighborCache, Topology, TopologyDiscoverer, _canon,
+                       render_topology_tree)
+from mock_devices import MockNetworkDevice
+from parsers import PROTOCOL_CDP, Neighbor, parse_cdp_neighbors_detail, parse_lldp_neighbors_detail
+
+
+class TypeAheadConnection:
+    """
+    Stands in for a Netmiko session answering typed-ahead commands
+    
+    The device echoes each command after the prompt that precedes it, so the
+    channel reads back as: cmd1, output1, prompt + cmd2, output2, prompt.
+    """
+    
+    device_type = 'cisco_ios'
+    
+    def __init__(self, hostname: str, outputs: dict):
+        self.base_prompt = hostname
+        self.outputs = outputs  # command -> output
+        self.commands = []
+    
+    def normalize_cmd(self, command: str) -> str:
+        return command.rstrip() + "\n"
+    
+    def write_channel(self, data: str):
+        self.commands.extend(data.splitlines())
+    
+    def read_until_pattern(self, pattern: str, read_timeout: float, re_flags: int) -> str:
+        prompt = f"{self.base_prompt}#"
+        channel = "".join(f"{command}\r\n{self.outputs[command]}\r\n{prompt}" for command in self.commands)
+        match = re.search(pattern, channel, flags=re_flags)
+        assert match, f"pattern {pattern!r} never matched"
+        return channel[:match.end()]
+
+
+
+
+class SendCommandConnection:
+    """Stands in for a Netmiko session on a device whose prompt isn't base_prompt plus > or #"""
+    
+    def __init__(self, device_type: str, base_prompt: str, outputs: dict):
+        self.device_type = device_type
+        self.base_prompt = base_prompt
+        self.outputs = outputs  # command -> output
+        self.sent = []
+    
+    def send_command(self, command: str, read_timeout: float) -> str:
+        self.sent.append(command)
+        return self.outputs[command]
+    
+    def write_channel(self, data: str):
+        raise AssertionError(f"typed ahead on {self.device_type}, whose prompt can't be split on")
+
+
+class FakeClock:
+    """Replacement for time.monotonic() that only moves when told to"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingCache(NeighborCache):
+    """NeighborCache counting lookups that found a fresh entry"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.hits = 0
+    
+    def get(self, key):
+        cached = super().get(key)
+        if cached is not None:
+            self.hits += 1
+        return cached
+
+
+class FakeSession:
+    """Pooled session double recording whether it was disconnected"""
+    
+    def __init__(self, name: str, alive: bool = True):
+        self.name = name
+        self.alive = alive
+        self.closed = False
+    
+    def is_alive(self) -> bool:
+        return self.alive
+    
+    def disconnect(self):
+        self.closed = True
+
+
+class CountingPool(ConnectionPool):
+    """ConnectionPool counting the new sessions it had to open"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.opened = 0
+    
+    def acquire(self, key, connect):
+        def counted_connect():
+            self.opened += 1
+            return connect()
+        return super().acquire(key, counted_connect)
+
+class CannedDiscoverer(TopologyDiscoverer):
+    """Discoverer answering probes from a fixed {ip: (hostname, [(neighbor, ip)])} network"""
+    
+    def __init__(self, network: dict, **kwargs):
+        super().__init__(DeviceTypeDetector('config/device_type_patterns.yaml'), **kwargs)
+        self.network = network
+    
+    def _probe(self, ip: str, device_type: str):
+        hostname, neighbors = self.network[ip]
+        return hostname, [
+            Neighbor(remote_device=name, remote_ip=neighbor_ip, remote_platform="cisco WS-C2960X-48",
+                     remote_capabilities="Switch IGMP", local_intf=f"Gi0/{i}", remote_intf="Gi0/0",
+                     protocols_mask=PROTOCOL_CDP)
+            for i, (name, neighbor_ip) in enumerate(neighbors)
+        ]
+
+def test_overlapping_discoveries_under_gevent():
+    """Overlapping discover() calls from greenlets (gunicorn -k gevent) all complete"""
+    pytest.importorskip('gevent')
+    
+    # Monkey patching is process-wide, so run the greenlets in a child interpreter
+    script = textwrap.dedent("""
+        from gevent import monkey
+        monkey.patch_all()
+
+        import sys
+        import gevent
+
+        sys.path.insert(0, 'app')
+        from device_detector import DeviceTypeDetector
+        from discovery import TopologyDiscoverer, NeighborCache
+
+        detector = DeviceTypeDetector('config/device_type_patterns.yaml')
+
+        def run():
+            discoverer = TopologyDiscoverer(detector, max_depth=3, cache=NeighborCache(ttl=0))
+            topology = discoverer.discover("192.168.1.1", "cisco_ios", "demo", "demo")
+            return len(topology.devices)
+
+        jobs = [gevent.spawn(run) for _ in range(4)]
+        gevent.joinall(jobs, raise_error=True)
+        print([job.value for job in jobs])
+    """)
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=120)
+    
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[5, 5, 5, 5]"
+
+
+def test_send_batched_hostname_prefixing_output_lines():
+    """A hostname that starts output lines ("Device" vs "Device ID:") doesn't split the output"""
+    mock = MockNetworkDevice.MOCK_DEVICES['192.168.1.1']
+    outputs = dict(zip(NEIGHBOR_COMMANDS, (mock['cdp_output'], mock['lldp_output'])))
+    conn = TypeAheadConnection("Device", outputs)
+    discoverer = TopologyDiscoverer(DeviceTypeDetector('config/device_type_patterns.yaml'))
+    
+    cdp_output, lldp_output = discoverer._send_batched(conn, NEIGHBOR_COMMANDS)
+    
+    assert "Device ID:" in cdp_output
+    assert len(parse_cdp_neighbors_detail(cdp_output)) == len(parse_cdp_neighbors_detail(mock['cdp_output'])) > 0
+    assert len(parse_lldp_neighbors_detail(lldp_output)) == len(parse_lldp_neighbors_detail(mock['lldp_output'])) > 0
+
+
+def test_render_unknown_root():
+    """A root that isn't in the topology renders on its own"""
+    topology = Topology()
+    topology.add_device("R1", "10.0.0.1")
+    topology.add_link(Link(local_device="R1", local_intf="Gi0/0", remote_device="R2", remote_intf="Gi0/1"))
+    
+    assert render_topology_tree(topology, root="NOT-THERE") == "NOT-THERE"
+
+
+def test_render_topology_built_without_helpers():
+    """A Topology filled in directly (name2id left empty) still renders"""
+    link = Link(local_device="R1", local_intf="Gi0/0", remote_device="R2", remote_intf="Gi0/1", protocols=["CDP"])
+    topology = Topology(devices={
+        "R1": Device(hostname="R1", mgmt_ip="10.0.0.1", links=[link]),
+        "R2": Device(hostname="R2", mgmt_ip="10.0.0.2"),
+    })
+    
+    assert render_topology_tree(topology) == "\n".join([
+        "R1 (10.0.0.1)",
+        "   └─[CDP] Gi0/0 ↔ Gi0/1",
+        "      R2 (10.0.0.2)",
+    ])
+    assert topology.name2id == {}
+
+
+def test_devices_sharing_a_hostname_are_all_crawled():
+    """Two factory-default "Switch" devices at different IPs both get probed"""
+    network = {
+        "10.0.0.1": ("CORE", [("DIST-1", "10.0.1.1"), ("DIST-2", "10.0.1.2")]),
+        "10.0.1.1": ("DIST-1", [("Switch", "10.0.2.1")]),
+        "10.0.1.2": ("DIST-2", [("Switch", "10.0.2.2")]),
+        "10.0.2.1": ("Switch", [("ACC-A", "10.0.3.1")]),
+        "10.0.2.2": ("Switch", [("ACC-B", "10.0.3.2")]),
+        "10.0.3.1": ("ACC-A", []),
+        "10.0.3.2": ("ACC-B", []),
+    }
+    discoverer = CannedDiscoverer(network, max_depth=3)
+    
+    topology = discoverer.discover("10.0.0.1", "cisco_ios", "demo", "demo")
+    
+    assert discoverer.visited == set(network)
+    assert {"ACC-A", "ACC-B"} <= set(topology.devices)
+
+
+def test_canon_collapses_address_spellings():
+    """Equivalent spellings of an address share one dedupe key"""
+    assert _canon("10.000.000.001") == _canon("010.0.0.1") == _canon(" 10.0.0.1 ") == _canon("10.0.0.1")
+    assert _canon("FE80:0::1") == _canon("fe80::1")
+    assert _canon("Core-SW") == _canon("core-sw") == "core-sw"
+    assert _canon("300.0.0.1") == "300.0.0.1"
+
+
+def test_unknown_prompt_shapes_send_one_command_at_a_time():
+    """Comware (<HPE>) and EXOS (host.3 #) prompts don't fit _send_batched's pattern"""
+    mock = MockNetworkDevice.MOCK_DEVICES['192.168.1.1']
+    outputs = dict(zip(NEIGHBOR_COMMANDS, (mock['cdp_output'], mock['lldp_output'])))
+    discoverer = TopologyDiscoverer(DeviceTypeDetector('config/device_type_patterns.yaml'))
+    
+    for device_type, base_prompt in (('hp_comware', "HPE"), ('extreme', "host")):
+        conn = SendCommandConnection(device_type, base_prompt, outputs)
+        neighbors = discoverer._discover_neighbors(conn, base_prompt)
+        
+        assert conn.sent == NEIGHBOR_COMMANDS
+        assert {n.remote_device for n in neighbors} == {"DIST-SW-01", "DIST-SW-02"}
+
+
+def test_neighbor_cache_expires_entries(monkeypatch):
+    """Entries are served until the TTL runs out"""
+    clock = FakeClock()
+    monkeypatch.setattr(discovery.time, 'monotonic', clock)
+    cache = NeighborCache(ttl=300)
+    
+    cache.put("key", "R1", [])
+    clock.now += 299
+    assert cache.get("key") == ("R1", [])
+    clock.now += 1
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_neighbor_cache_sweeps_expired_and_caps_size(monkeypatch):
+    """put() drops expired entries without a lookup, then the oldest beyond max_size"""
+    clock = FakeClock()
+    monkeypatch.setattr(discovery.time, 'monotonic', clock)
+    cache = NeighborCache(ttl=300, max_size=2)
+    
+    cache.put("a", "A", [])
+    clock.now += 300
+    cache.put("b", "B", [])
+    assert len(cache) == 1
+    
+    cache.put("c", "C", [])
+    cache.put("b", "B", [])  # Refreshing b makes c the oldest
+    cache.put("d", "D", [])
+    assert len(cache) == 2
+    assert cache.get("c") is None
+    assert cache.get("b") == ("B", []) and cache.get("d") == ("D", [])
+
+
+def test_neighbor_cache_keyed_on_credentials_and_skipped_on_refresh():
+    """Results are only reused for the same credentials, and never on a refresh"""
+    cache = CountingCache(ttl=300)
+    detector = DeviceTypeDetector('config/device_type_patterns.yaml')
+    
+    def hits(username: str, refresh: bool = False) -> int:
+        before = cache.hits
+        discoverer = TopologyDiscoverer(detector, max_depth=3, cache=cache, refresh=refresh)
+        topology = discoverer.discover("192.168.1.1", "cisco_ios", username, "demo")
+        assert len(topology.devices) == 5
+        return cache.hits - before
+    
+    assert hits("alice") == 0
+    assert hits("alice") == 5
+    assert hits("bob") == 0
+    assert hits("alice", refresh=True) == 0
+
+
+def test_pool_reuses_released_sessions():
+    """A released session is handed out again for the same key only"""
+    pool = ConnectionPool(idle_timeout=3600)
+    first = pool.acquire(("10.0.0.1",), lambda: FakeSession("first"))
+    pool.release(("10.0.0.1",), first)
+    
+    assert pool.acquire(("10.0.0.1",), lambda: FakeSession("new")) is first
+    assert pool.acquire(("10.0.0.2",), lambda: FakeSession("other")).name == "other"
+    assert len(pool) == 0
+
+
+def test_pool_replaces_dead_sessions():
+    """An idle session whose transport died is closed, and a new one opened"""
+    pool = ConnectionPool(idle_timeout=3600)
+    dead = FakeSession("dead")
+    pool.release(("10.0.0.1",), pool.acquire(("10.0.0.1",), lambda: dead))
+    dead.alive = False
+    
+    assert pool.acquire(("10.0.0.1",), lambda: FakeSession("new")).name == "new"
+    assert dead.closed
+
+
+def test_pool_evicts_least_recently_used(monkeypatch):
+    """Past max_size idle sessions, the least recently released one is closed"""
+    clock = FakeClock()
+    monkeypatch.setattr(discovery.time, 'monotonic', clock)
+    pool = ConnectionPool(max_size=2, idle_timeout=3600)
+    sessions = {}
+    for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        sessions[ip] = pool.acquire((ip,), lambda: FakeSession(ip))
+    for ip in ("10.0.0.2", "10.0.0.1", "10.0.0.3"):
+        clock.now += 1
+        pool.release((ip,), sessions[ip])
+    
+    assert len(pool) == 2
+    assert [ip for ip, session in sessions.items() if session.closed] == ["10.0.0.2"]
+
+
+def test_pool_reaps_idle_and_old_sessions(monkeypatch):
+    """The reaper closes sessions idle past idle_timeout or older than max_age"""
+    clock = FakeClock()
+    monkeypatch.setattr(discovery.time, 'monotonic', clock)
+    pool = ConnectionPool(idle_timeout=120, max_age=900)
+    
+    old = pool.acquire(("old",), lambda: FakeSession("old"))
+    clock.now += 790
+    idle = pool.acquire(("idle",), lambda: FakeSession("idle"))
+    fresh = pool.acquire(("fresh",), lambda: FakeSession("fresh"))
+    pool.release(("idle",), idle)
+    clock.now += 100
+    pool.release(("old",), old)
+    pool.release(("fresh",), fresh)
+    assert len(pool) == 3
+    
+    clock.now += 20  # idle: unused for 120s; old: 910s old; fresh: unused for 20s
+    pool._reap()
+    
+    assert (old.closed, idle.closed, fresh.closed) == (True, True, False)
+    assert len(pool) == 1
+    pool.close_all()
+    assert fresh.closed
+
+
+def test_sessions_closed_when_the_cache_outlives_the_pool():
+    """With the cache TTL above the idle timeout, sessions are closed after each probe"""
+    pool = CountingPool(idle_timeout=120)
+    discoverer = TopologyDiscoverer(DeviceTypeDetector('config/device_type_patterns.yaml'),
+                                    cache=NeighborCache(ttl=300), pool=pool)
+    
+    discoverer.discover("192.168.1.1", "cisco_ios", "demo", "demo")
+    
+    assert not discoverer.reuse_sessions
+    assert pool.opened == 5
+    assert len(pool) == 0
+
+
+def test_sessions_reused_when_the_cache_is_off():
+    """Without a cache in front of it, a second discovery reuses every pooled session"""
+    pool = CountingPool(idle_timeout=120)
+    detector = DeviceTypeDetector('config/device_type_patterns.yaml')
+    
+    for _ in range(2):
+        discoverer = TopologyDiscoverer(detector, cache=NeighborCache(ttl=0), pool=pool)
+        discoverer.discover("192.168.1.1", "cisco_ios", "demo", "demo")
+    
+    assert pool.opened == 5
+    assert len(pool) == 5
+    pool.close_all()
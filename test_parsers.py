@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the CDP/LLDP output parsers
+Run with pytest from the repository root
+"""
+
+import sys
+
+sys.path.insert(0, 'app')
+
+from mock_devices import MockNetworkDevice
+from parsers import parse_lldp_neighbors_detail
+
+
+def test_lldp_management_ip_and_description():
+    """The management IP is parsed, not folded into the system description"""
+    neighbors = parse_lldp_neighbors_detail(MockNetworkDevice.MOCK_DEVICES['192.168.1.1']['lldp_output'])
+    
+    assert [(n.remote_device, n.remote_ip, n.local_intf, n.remote_intf) for n in neighbors] == [
+        ("DIST-SW-01", "192.168.1.10", "Gi1/0/1", "Gi1/0/48"),
+        ("DIST-SW-02", "192.168.1.11", "Gi1/0/2", "Gi1/0/48"),
+    ]
+    for neighbor in neighbors:
+        assert neighbor.system_description == "Cisco IOS Software, C3750E Software (C3750E-UNIVERSALK9-M), Version 15.2(4)E8"
+        assert neighbor.remote_capabilities == "B,R"